@@ -5,7 +5,7 @@ import os
 from turtle import st
 
 from pandas import DataFrame
-from etl.models import Ride, Station, Station2, get_station_id_aliases, get_station_name_aliases
+from etl.models import Ride, Station, get_station_id_aliases, get_station_name_aliases
 
 from etl.read import load_ride, process_ride_df, sha256sum
 from etl.store import Store
@@ -88,47 +88,59 @@ def df_to_rides(
     return rides, exceptions
 
 
-def run_stations(store: Store):
+def run_stations(store: Store) -> int:
     stations1 = read_stations1()
     stations2 = read_stations2()
     stations = list({station.station_id: station for station in itertools.chain(stations1, stations2)}.values())
-    store.persist_station_data(stations)
+    n_stations = store.persist_station_data(stations)
     with store.conn.cursor() as cur:
         cur.execute(open("data/manual_stations.sql").read())
+        n_stations += max(cur.rowcount, 0)
     store.commit()
+    return n_stations
 
 
 def run(store: Store):
-    run_stations(store)
-    stations_ids = store.station_ids
-    stations_terminals = store.station_terminal_id_map
-    stations_names = store.station_name_id_map
-    manual_id_map = {
-        "137": "259",
-        "300006-1": "852",
-        "639": "852",
-    }
-    for file in list_files(store):
-        if file == "325JourneyDataExtract06Jul2022-12Jul2022.csv":
-            continue
-        filehash = sha256sum(RIDE_DATA_DIR + file)
-        logging.info(f"Processing {file}")
-        df = load_ride(RIDE_DATA_DIR + file)
-        df = process_ride_df(df)
-        rides, exceptions = df_to_rides(df, stations_ids, stations_terminals, stations_names, manual_id_map)
-        try:
-            n_rides = store.persist_ride_data(rides, file)
-            if exceptions:
-                logging.warning(f"{len(exceptions)} exceptions occurred for file {file}")
-                store.persist_exceptions(exceptions, file)
-            store.persist_file_hash(file, filehash)
-        except Exception as exc:
-            logging.error(str(exc))
+    n_committed = 0
+    try:
+        if run_stations(store):
+            n_committed += 1
+        stations_ids = store.station_ids
+        stations_terminals = store.station_terminal_id_map
+        stations_names = store.station_name_id_map
+        manual_id_map = {
+            "137": "259",
+            "300006-1": "852",
+            "639": "852",
+        }
+        for file in list_files(store):
+            if file == "325JourneyDataExtract06Jul2022-12Jul2022.csv":
+                continue
+            filehash = sha256sum(RIDE_DATA_DIR + file)
+            logging.info(f"Processing {file}")
+            df = load_ride(RIDE_DATA_DIR + file)
+            df = process_ride_df(df)
+            rides, exceptions = df_to_rides(df, stations_ids, stations_terminals, stations_names, manual_id_map)
+            try:
+                n_rides = store.persist_ride_data(rides, file)
+                if exceptions:
+                    logging.warning(f"{len(exceptions)} exceptions occurred for file {file}")
+                    store.persist_exceptions(exceptions, file)
+                store.persist_file_hash(file, filehash)
+            except Exception as exc:
+                logging.error(str(exc))
+                store.rollback()
+            else:
+                store.commit()
+                n_committed += 1
+                logging.info(f"Successfully processed {file}")
+                logging.info(f"{n_rides} new rides added")
+    finally:
+        # Mark the run even if a later file aborted it, so the app picks up what was committed.
+        if n_committed:
             store.rollback()
-        else:
+            store.mark_run_complete()
             store.commit()
-            logging.info(f"Successfully processed {file}")
-            logging.info(f"{n_rides} new rides added")
 
 
 if __name__ == "__main__":
@@ -21,6 +21,10 @@ class Store(ABC):
     def persist_file_hash(self, filename: str, filehash: str) -> None:
         raise NotImplementedError
 
+    @abstractmethod
+    def mark_run_complete(self) -> None:
+        raise NotImplementedError
+
     @abstractmethod
     def commit(self) -> None:
         raise NotImplementedError
@@ -135,6 +139,19 @@ class PGStore(Store):
                 (filename, filehash),
             )
 
+    def mark_run_complete(self) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                    CREATE TABLE IF NOT EXISTS etl_runs (
+                        id SERIAL PRIMARY KEY,
+                        completed_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+            """
+            )
+            cur.execute("REFRESH MATERIALIZED VIEW rides_by_day")
+            cur.execute("INSERT INTO etl_runs DEFAULT VALUES")
+
     def commit(self) -> None:
         self.conn.commit()
 
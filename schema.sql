@@ -52,4 +52,9 @@ CREATE MATERIALIZED VIEW rides_by_day AS (
 CREATE TABLE bank_hols (
     date DATE NOT NULL UNIQUE,
     name TEXT NOT NULL
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS etl_runs (
+    id SERIAL PRIMARY KEY,
+    completed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -1,18 +1,19 @@
 from datetime import datetime
 import requests
-import psycopg2
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 from plotly.graph_objects import Figure
 import pydeck as pdk
 
+from data import DataLayer
+
 st.set_page_config(layout="wide")
 
 
 @st.cache_resource
-def get_conn():
-    return psycopg2.connect(dbname="cyclehire")
+def get_data_layer() -> DataLayer:
+    return DataLayer(dbname="cyclehire")
 
 
 def plot_rides(df: pd.DataFrame) -> Figure:
@@ -37,10 +38,8 @@ def plot_rides(df: pd.DataFrame) -> Figure:
     return fig
 
 
-@st.cache_data
 def load_data() -> pd.DataFrame:
-    conn = get_conn()
-    df = pd.read_sql(
+    df = get_data_layer().query(
         """
                     SELECT
                         rides_by_day.*,
@@ -57,8 +56,7 @@ def load_data() -> pd.DataFrame:
                         date > '2012-01-01'
                     ORDER BY
                         date;
-        """,
-        conn,
+        """
     )
     return df
 
@@ -67,11 +65,9 @@ df = load_data()
 fig = plot_rides(df)
 
 
-@st.cache_data
 def load_stations_date(date) -> pd.DataFrame:
-    conn = get_conn()
-    df = pd.read_sql(
-        f"""
+    df = get_data_layer().query(
+        """
         SELECT
             s.lat lat_s,
             s.lng lng_s,
@@ -84,10 +80,10 @@ def load_stations_date(date) -> pd.DataFrame:
             rides
             LEFT JOIN stations s ON rides.start_station_id = s.station_id
             LEFT JOIN stations e ON rides.end_station_id = e.station_id
-            WHERE start_time::DATE = '{date}'
+            WHERE start_time::DATE = %(date)s
             GROUP BY 1,2,3,4,5,6;
         """,
-        conn,
+        {"date": date},
     )
     return df
 
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import pandas as pd
+from psycopg2 import errors
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+CACHE_PATH = os.environ.get(
+    "CYCLEHIRE_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "cyclehire", "query_cache.sqlite"),
+)
+CACHE_TTL_SECONDS = 24 * 60 * 60
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_TOUCH_SECONDS = 60
+MEMORY_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RUN_CHECK_SECONDS = 30
+
+
+def normalize_query(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def cache_key(sql: str, params: dict | None = None) -> str:
+    payload = json.dumps([normalize_query(sql), params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class DiskCache:
+    """SQLite-backed result cache shared by every server process on the host.
+
+    Entries expire after `ttl` seconds; once the total payload exceeds `max_bytes`
+    the least recently used entries are evicted. Entries are tagged with the ETL
+    run they were computed against and dropped once a newer run completes.
+    Cached values are pickles, so the file is created readable by its owner only.
+    """
+
+    def __init__(self, path: str, ttl: float = CACHE_TTL_SECONDS, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = os.path.abspath(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    run_id INTEGER,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str, run_id: int | None):
+        """Return `(value, created_at)` for a live entry, or None on a miss."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at, accessed_at FROM cache WHERE key = ? AND run_id IS ? AND created_at > ?",
+                (key, run_id, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            blob, created_at, accessed_at = row
+            try:
+                value = pickle.loads(blob)
+            except Exception:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            # Only take the write lock when the LRU timestamp is noticeably stale.
+            if now - accessed_at > CACHE_TOUCH_SECONDS:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value, created_at
+
+    def touch(self, key: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+                (now, key, now - CACHE_TOUCH_SECONDS),
+            )
+
+    def set(self, key: str, run_id: int | None, value) -> float:
+        now = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return now
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, run_id, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, run_id, blob, len(blob), now, now),
+            )
+            conn.execute("DELETE FROM cache WHERE created_at <= ?", (now - self.ttl,))
+            conn.execute(
+                """
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running
+                        FROM cache
+                    ) WHERE running > ?
+                )
+                """,
+                (self.max_bytes,),
+            )
+        return now
+
+    def invalidate(self, run_id: int | None = None) -> None:
+        with self._connect() as conn:
+            if run_id is None:
+                conn.execute("DELETE FROM cache")
+            else:
+                conn.execute("DELETE FROM cache WHERE run_id IS NOT ?", (run_id,))
+
+
+class MemoryCache:
+    """Per-process LRU in front of `DiskCache`, bounded by `max_bytes` and sharing its TTL.
+
+    Hits are forwarded to the disk cache at most every `CACHE_TOUCH_SECONDS` so
+    entries that are hot in memory are not evicted from disk as least recently used.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_bytes: int = MEMORY_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        """Return `(value, touch_due)` for a live entry, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, created_at, touched_at = entry
+            if now - created_at >= self.ttl:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            touch_due = now - touched_at > CACHE_TOUCH_SECONDS
+            if touch_due:
+                self._entries[key] = (value, size, created_at, now)
+            return value, touch_due
+
+    def set(self, key, value, size: int, created_at: float) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, size, created_at, time.time())
+            self._size += size
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key) -> None:
+        self._size -= self._entries.pop(key)[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+
+class DataLayer:
+    def __init__(self, minconn: int = 1, maxconn: int = 8, cache: DiskCache | None = None, **kwargs):
+        self.pool = ThreadedConnectionPool(minconn, maxconn, **kwargs)
+        # getconn() raises rather than blocks when the pool is exhausted, so queue callers here.
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.cache = cache or DiskCache(CACHE_PATH)
+        self.memory = MemoryCache(ttl=self.cache.ttl)
+        self._flight = SingleFlight()
+        self._run_lock = threading.Lock()
+        self._run_id = None
+        self._run_checked_at = 0.0
+
+    @contextmanager
+    def connection(self, blocking: bool = True):
+        if not self._slots.acquire(blocking=blocking):
+            raise PoolError("connection pool exhausted")
+        try:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+            finally:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        broken = True
+                self.pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    @property
+    def run_id(self) -> int | None:
+        # Never queue behind the probe or a busy pool; serve the last known run instead.
+        if time.monotonic() - self._run_checked_at < RUN_CHECK_SECONDS:
+            return self._run_id
+        # Before the first successful check there is no last known run to fall back to.
+        if not self._run_lock.acquire(blocking=not self._run_checked_at):
+            return self._run_id
+        try:
+            if time.monotonic() - self._run_checked_at < RUN_CHECK_SECONDS:
+                return self._run_id
+            with self.connection(blocking=False) as conn, conn.cursor() as cur:
+                try:
+                    cur.execute("SELECT max(id) FROM etl_runs")
+                    (run_id,) = cur.fetchone()
+                except errors.UndefinedTable:
+                    run_id = None
+        except PoolError:
+            return self._run_id
+        else:
+            if run_id != self._run_id:
+                self.cache.invalidate(run_id)
+                self.memory.clear()
+                self._run_id = run_id
+            self._run_checked_at = time.monotonic()
+            return run_id
+        finally:
+            self._run_lock.release()
+
+    def query(self, sql: str, params: dict | None = None) -> pd.DataFrame:
+        key = cache_key(sql, params)
+        run_id = self.run_id
+
+        def load() -> pd.DataFrame:
+            hit = self.cache.get(key, run_id)
+            if hit is None:
+                with self.connection() as conn:
+                    df = pd.read_sql(sql, conn, params=params)
+                created_at = self.cache.set(key, run_id, df)
+            else:
+                df, created_at = hit
+            self.memory.set((key, run_id), df, int(df.memory_usage(deep=True).sum()), created_at)
+            return df
+
+        hit = self.memory.get((key, run_id))
+        if hit is None:
+            df = self._flight.do(f"{run_id}:{key}", load)
+        else:
+            df, touch_due = hit
+            if touch_due:
+                self.cache.touch(key)
+        return df.copy()
+
+    def close(self) -> None:
+        self.pool.closeall()
@@ -0,0 +1,327 @@
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pytest
+from psycopg2 import errors
+
+import data
+from data import DataLayer, DiskCache, MemoryCache, SingleFlight, cache_key
+
+
+def cached_keys(cache: DiskCache) -> set[str]:
+    with sqlite3.connect(cache.path) as conn:
+        return {key for key, in conn.execute("SELECT key FROM cache")}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(data.time, "time", lambda: now[0])
+    return now
+
+
+def test_cache_key_ignores_surrounding_whitespace_and_semicolon():
+    assert cache_key("\n  SELECT 1;\n", {"d": 1}) == cache_key("SELECT 1", {"d": 1})
+    assert cache_key("SELECT 'a  b'") != cache_key("SELECT 'a b'")
+    assert cache_key("SELECT 1", {"d": 1}) != cache_key("SELECT 1", {"d": 2})
+
+
+def test_disk_cache_roundtrip(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite")
+    created_at = cache.set("k", 1, [1, 2, 3])
+    assert cache.get("k", 1) == ([1, 2, 3], created_at)
+    assert cache.get("k", 2) is None
+    assert cache.get("missing", 1) is None
+
+
+def test_disk_cache_ttl(tmp_path, clock):
+    cache = DiskCache(tmp_path / "cache.sqlite", ttl=10)
+    cache.set("k", 1, "value")
+    clock[0] += 9
+    assert cache.get("k", 1)[0] == "value"
+    clock[0] += 2
+    assert cache.get("k", 1) is None
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path, clock):
+    value = list(range(200))
+    cache = DiskCache(tmp_path / "cache.sqlite", max_bytes=1000)
+    cache.set("a", 1, value)
+    clock[0] += 1
+    cache.set("b", 1, value)
+    clock[0] += data.CACHE_TOUCH_SECONDS + 1
+    assert cache.get("a", 1)[0] == value
+    clock[0] += 1
+    cache.set("c", 1, value)
+    assert cached_keys(cache) == {"a", "c"}
+
+
+def test_disk_cache_touch_protects_entry_from_eviction(tmp_path, clock):
+    value = list(range(200))
+    cache = DiskCache(tmp_path / "cache.sqlite", max_bytes=1000)
+    cache.set("a", 1, value)
+    clock[0] += 1
+    cache.set("b", 1, value)
+    clock[0] += data.CACHE_TOUCH_SECONDS + 1
+    cache.touch("a")
+    clock[0] += 1
+    cache.set("c", 1, value)
+    assert cached_keys(cache) == {"a", "c"}
+
+
+def test_disk_cache_drops_unreadable_entry(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite")
+    cache.set("k", 1, "value")
+    with sqlite3.connect(cache.path) as conn:
+        conn.execute("UPDATE cache SET value = ?", (b"not a pickle",))
+    assert cache.get("k", 1) is None
+    assert cached_keys(cache) == set()
+
+
+def test_disk_cache_invalidate(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite")
+    cache.set("old", 1, "x")
+    cache.set("new", 2, "y")
+    cache.invalidate(2)
+    assert cached_keys(cache) == {"new"}
+    cache.invalidate()
+    assert cached_keys(cache) == set()
+
+
+def test_memory_cache_ttl_counts_from_created_at(clock):
+    cache = MemoryCache(ttl=10)
+    cache.set("k", "value", 1, created_at=clock[0] - 5)
+    assert cache.get("k") == ("value", False)
+    clock[0] += 6
+    assert cache.get("k") is None
+
+
+def test_memory_cache_evicts_by_bytes(clock):
+    cache = MemoryCache(max_bytes=10)
+    cache.set("a", "a", 4, clock[0])
+    cache.set("b", "b", 4, clock[0])
+    cache.get("a")
+    cache.set("c", "c", 4, clock[0])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    cache.set("huge", "huge", 11, clock[0])
+    assert cache.get("huge") is None
+
+
+def test_memory_cache_reports_touch_due(clock):
+    cache = MemoryCache()
+    cache.set("k", "value", 1, clock[0])
+    clock[0] += data.CACHE_TOUCH_SECONDS + 1
+    assert cache.get("k") == ("value", True)
+    assert cache.get("k") == ("value", False)
+
+
+def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.2)
+        return 42
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", load))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [42] * 5
+
+
+def test_single_flight_propagates_errors_and_forgets_key():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: 1) == 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.conn.pool.run_id is errors.UndefinedTable:
+            raise errors.UndefinedTable("relation \"etl_runs\" does not exist")
+
+    def fetchone(self):
+        return (self.conn.pool.run_id,)
+
+
+class FakeConn:
+    def __init__(self, pool=None, fail_rollback=False):
+        self.pool = pool
+        self.closed = 0
+        self.fail_rollback = fail_rollback
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise RuntimeError("server closed the connection")
+
+
+class FakePool:
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self.in_use = 0
+        self.returned = []
+        self.next_conn = None
+        self.run_id = 1
+
+    def getconn(self):
+        if self.in_use >= self.maxconn:
+            raise RuntimeError("connection pool exhausted")
+        self.in_use += 1
+        return self.next_conn or FakeConn(self)
+
+    def putconn(self, conn, close=False):
+        self.in_use -= 1
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def layer(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, "ThreadedConnectionPool", FakePool)
+    return DataLayer(maxconn=2, cache=DiskCache(tmp_path / "cache.sqlite"))
+
+
+def test_connection_waits_for_free_slot(layer):
+    errors = []
+
+    def use():
+        try:
+            with layer.connection():
+                time.sleep(0.05)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=use) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(layer.pool.returned) == 6
+
+
+def test_connection_discards_broken_connection(layer):
+    conn = layer.pool.next_conn = FakeConn(fail_rollback=True)
+    with pytest.raises(KeyError):
+        with layer.connection():
+            raise KeyError("original")
+    assert layer.pool.returned == [(conn, True)]
+    assert layer.pool.in_use == 0
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+
+    def read_sql(sql, conn, params=None):
+        calls.append(params)
+        time.sleep(0.05)
+        return pd.DataFrame({"n": [1, 2, 3]})
+
+    monkeypatch.setattr(pd, "read_sql", read_sql)
+    return calls
+
+
+def test_query_reads_once_then_serves_from_memory(layer, reads, monkeypatch):
+    first = layer.query("SELECT n FROM t WHERE d = %(d)s", {"d": 1})
+    monkeypatch.setattr(layer.cache, "get", lambda *args: pytest.fail("memory tier missed"))
+    second = layer.query("SELECT n FROM t WHERE d = %(d)s;", {"d": 1})
+    assert reads == [{"d": 1}]
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_query_returns_copies(layer, reads):
+    df = layer.query("SELECT n FROM t")
+    df["n"] = 0
+    assert list(layer.query("SELECT n FROM t")["n"]) == [1, 2, 3]
+
+
+def test_query_falls_back_to_disk_cache(layer, reads):
+    layer.query("SELECT n FROM t")
+    layer.memory.clear()
+    layer.query("SELECT n FROM t")
+    assert len(reads) == 1
+
+
+def test_query_collapses_concurrent_requests(layer, reads):
+    threads = [threading.Thread(target=layer.query, args=("SELECT n FROM t", {"d": 1})) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(reads) == 1
+
+
+def test_query_rereads_after_etl_run(layer, reads, monkeypatch):
+    monkeypatch.setattr(data, "RUN_CHECK_SECONDS", 0)
+    layer.query("SELECT n FROM t")
+    layer.query("SELECT n FROM t")
+    layer.pool.run_id = 2
+    layer.query("SELECT n FROM t")
+    assert len(reads) == 2
+    with sqlite3.connect(layer.cache.path) as conn:
+        assert {run_id for run_id, in conn.execute("SELECT run_id FROM cache")} == {2}
+
+
+def test_single_flight_is_keyed_by_run(layer, monkeypatch):
+    monkeypatch.setattr(data, "RUN_CHECK_SECONDS", 0)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def read_sql(sql, conn, params=None):
+        calls.append(layer._run_id)
+        if len(calls) == 1:
+            started.set()
+            release.wait(1)
+        return pd.DataFrame({"run": [layer._run_id]})
+
+    monkeypatch.setattr(pd, "read_sql", read_sql)
+    old = threading.Thread(target=layer.query, args=("SELECT n FROM t",))
+    old.start()
+    started.wait(1)
+    layer.pool.run_id = 2
+    df = layer.query("SELECT n FROM t")
+    release.set()
+    old.join()
+    assert list(df["run"]) == [2]
+    assert calls == [1, 2]
+
+
+def test_run_id_is_none_without_etl_runs_table(layer):
+    layer.pool.run_id = errors.UndefinedTable
+    assert layer.run_id is None
+
+
+def test_run_id_does_not_wait_for_busy_pool(layer, monkeypatch):
+    monkeypatch.setattr(data, "RUN_CHECK_SECONDS", 0)
+    assert layer.run_id == 1
+    layer.pool.run_id = 2
+    with layer.connection(), layer.connection():
+        assert layer.run_id == 1
+    assert layer.run_id == 2
@@ -0,0 +1,113 @@
+import importlib
+
+import pytest
+
+from etl.store import Store
+
+
+class FakeStore(Store):
+    def __init__(self, fail_files=()):
+        self.fail_files = set(fail_files)
+        self.pending = []
+        self.log = []
+        self.runs = 0
+
+    def persist_ride_data(self, data, file_name=None):
+        if file_name in self.fail_files:
+            raise ValueError(f"bad file {file_name}")
+        self.pending.append(file_name)
+        return len(data)
+
+    def persist_station_data(self, data):
+        return 0
+
+    def persist_exceptions(self, exceptions, file):
+        pass
+
+    def persist_file_hash(self, filename, filehash):
+        pass
+
+    def mark_run_complete(self):
+        self.pending.append("run")
+
+    def commit(self):
+        self.log.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def get_file_hashes(self):
+        return {}
+
+    @property
+    def ride_ids(self):
+        return set()
+
+    @property
+    def station_ids(self):
+        return set()
+
+    station_name_id_map = {}
+    station_terminal_id_map = {}
+
+
+@pytest.fixture
+def run_module(tmp_path, monkeypatch):
+    # etl.run configures a log file in the working directory on import.
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("etl.run")
+    monkeypatch.setattr(module, "run_stations", lambda store: 0)
+    monkeypatch.setattr(module, "sha256sum", lambda path: path)
+    monkeypatch.setattr(module, "load_ride", lambda path: path)
+    monkeypatch.setattr(module, "process_ride_df", lambda df: df)
+    monkeypatch.setattr(module, "df_to_rides", lambda df, *maps: ([df], []))
+    return module
+
+
+def set_files(module, monkeypatch, files):
+    monkeypatch.setattr(module, "list_files", lambda store: iter(files))
+
+
+def test_no_marker_when_nothing_committed(run_module, monkeypatch):
+    set_files(run_module, monkeypatch, [])
+    store = FakeStore()
+    run_module.run(store)
+    assert store.log == []
+
+
+def test_no_marker_when_every_file_rolled_back(run_module, monkeypatch):
+    set_files(run_module, monkeypatch, ["a.csv"])
+    store = FakeStore(fail_files={"a.csv"})
+    run_module.run(store)
+    assert store.log == []
+
+
+def test_one_marker_per_successful_run(run_module, monkeypatch):
+    set_files(run_module, monkeypatch, ["a.csv", "b.csv"])
+    store = FakeStore()
+    run_module.run(store)
+    assert store.log == ["a.csv", "b.csv", "run"]
+
+
+def test_marker_for_station_changes_only(run_module, monkeypatch):
+    set_files(run_module, monkeypatch, [])
+    monkeypatch.setattr(run_module, "run_stations", lambda store: 3)
+    store = FakeStore()
+    run_module.run(store)
+    assert store.log == ["run"]
+
+
+def test_marker_written_when_run_aborts(run_module, monkeypatch):
+    set_files(run_module, monkeypatch, ["a.csv", "b.csv"])
+
+    def load_ride(path):
+        if path.endswith("b.csv"):
+            raise UnicodeDecodeError("utf-8", b"", 0, 1, "bad")
+        return path
+
+    monkeypatch.setattr(run_module, "load_ride", load_ride)
+    store = FakeStore()
+    with pytest.raises(UnicodeDecodeError):
+        run_module.run(store)
+    assert store.log == ["a.csv", "run"]